@@ -10,7 +10,8 @@
 # streamlit
 # langchain
 # openai
-# faiss-cpu
+# faiss-cpu>=1.8.0
+# numpy
 # tiktoken
 #
 # Then, run this command in your terminal:
@@ -23,65 +24,554 @@
 # 4. Navigate to the directory where you saved `app.py`.
 # 5. Run the app with the command: streamlit run app.py
 
+import hashlib
+import io
+import math
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import faiss
+import numpy as np
 import streamlit as st
-from langchain.text_splitter import CharacterTextSplitter
+from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
+from langchain.vectorstores.utils import DistanceStrategy
+from langchain.docstore import InMemoryDocstore
+from langchain.docstore.document import Document
 from langchain.chat_models import ChatOpenAI
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationSummaryBufferMemory
 from langchain.chains import ConversationalRetrievalChain
 from langchain.callbacks.base import BaseCallbackHandler
 
+# Use every core for FAISS training and search
+faiss.omp_set_num_threads(os.cpu_count() or 1)
+
+# Index settings: every document is stored with an 8-bit scalar quantizer,
+# one byte per dimension instead of four. Documents with at least
+# IVF_MIN_VECTORS chunks also get an inverted file, so a query only scans the
+# IVF_NPROBE closest lists, and the lists can be memory-mapped from the cache.
+# Scalar quantized vectors reconstruct almost exactly, which MMR relies on.
+IVF_MIN_VECTORS = 1024
+IVF_MAX_NLIST = 256
+# Faiss k-means wants at least this many training points per inverted list
+IVF_MIN_POINTS_PER_LIST = 39
+# Training on a random sample of this size is enough for the coarse quantizer
+IVF_MAX_TRAINING_VECTORS = 100_000
+IVF_NPROBE = 8
+# On a GPU each probe is cheap relative to the kernel launch, so probe more
+IVF_GPU_NPROBE = 16
+
+# OpenAI embedding model used for both chunks and questions
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Number of chunks sent to OpenAI in a single embeddings request, and how many
+# of those requests may be in flight at once
+EMBEDDING_BATCH_SIZE = 256
+EMBEDDING_CONCURRENCY = 20
+
+# Uploaded files are decoded and split in segments of about this many
+# characters, cut at line breaks, instead of decoding the whole file at once
+DOCUMENT_SEGMENT_SIZE = 1_000_000
+
+# Token-aware splitter settings, measured in tiktoken tokens
+SPLITTER_ENCODING = "cl100k_base"
+SPLITTER_CHUNK_SIZE = 800
+SPLITTER_CHUNK_OVERLAP = 120
+
+# Vector stores are saved here, keyed by the SHA-256 of the document text and
+# of the settings that shaped the entry, so re-uploading the same document
+# skips the embedding step entirely. Each entry is a directory holding the
+# FAISS index and the pickled docstore. Bump CACHE_FORMAT_VERSION when the
+# saved files or the index types change.
+CACHE_DIR = os.path.join(".", ".cache")
+CACHE_INDEX_FILE = "index.faiss"
+CACHE_DOCSTORE_FILE = "docstore.pkl"
+CACHE_FORMAT_VERSION = 2
+CACHE_SETTINGS = (
+    CACHE_FORMAT_VERSION,
+    DOCUMENT_SEGMENT_SIZE,
+    SPLITTER_ENCODING,
+    SPLITTER_CHUNK_SIZE,
+    SPLITTER_CHUNK_OVERLAP,
+    EMBEDDING_MODEL,
+    IVF_MIN_VECTORS,
+    IVF_MAX_NLIST,
+    IVF_MIN_POINTS_PER_LIST,
+    IVF_MAX_TRAINING_VECTORS
+)
+
+# OpenAI clients are cached per API key; bound how many keys are kept in
+# process memory and for how long, since a deployment is shared by many users
+CLIENT_CACHE_MAX_ENTRIES = 32
+CLIENT_CACHE_TTL = 3600
+
+# Once the chat history exceeds this many tokens, older turns are summarized
+MEMORY_MAX_TOKENS = 1000
+
+# Minimum time between UI updates while streaming, in seconds (~30 FPS).
+# Each update re-renders the whole message, so it is not done per token.
+STREAM_RENDER_INTERVAL = 0.033
+
+# Maximal marginal relevance retrieval: fetch RETRIEVER_FETCH_K candidates,
+# then keep the RETRIEVER_K that best balance relevance and diversity
+RETRIEVER_K = 3
+RETRIEVER_FETCH_K = 16
+RETRIEVER_LAMBDA_MULT = 0.5
+
+# Only the most recent messages are rendered directly in the chat; older ones
+# are tucked into a collapsed expander
+CHAT_HISTORY_VISIBLE_MESSAGES = 20
+
 # Custom handler to display the thinking process in the UI
 class StreamlitCallbackHandler(BaseCallbackHandler):
     """A custom callback handler that writes intermediate steps to the Streamlit UI."""
     def __init__(self, container, initial_text=""):
         self.container = container
         self.text = initial_text
+        self._pending = deque()
+        self._last_render = 0.0
 
-    def on_llm_new_token(self, token: str, **kwargs) -> None:
-        """Append new tokens to the text and update the container."""
-        self.text += token
+    def _flush(self):
+        """Move buffered tokens into the text and redraw the container."""
+        self.text += "".join(self._pending)
+        self._pending.clear()
+        self._last_render = time.monotonic()
         self.container.markdown(self.text)
 
-def process_document(document_text, openai_api_key):
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        """Buffer new tokens and update the container at a throttled rate."""
+        self._pending.append(token)
+        if (time.monotonic() - self._last_render > STREAM_RENDER_INTERVAL
+                or token.endswith("\n")):
+            self._flush()
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        """Render any tokens still buffered when the model finishes."""
+        if self._pending:
+            self._flush()
+
+@st.cache_resource
+def get_text_splitter():
+    """
+    Returns the token-aware text splitter, created once per process so the
+    tiktoken BPE encoder is not reloaded on every Streamlit rerun.
+
+    Returns:
+        RecursiveCharacterTextSplitter: The shared text splitter.
+    """
+    return RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+        encoding_name=SPLITTER_ENCODING,
+        chunk_size=SPLITTER_CHUNK_SIZE,
+        chunk_overlap=SPLITTER_CHUNK_OVERLAP
+    )
+
+@st.cache_resource(max_entries=CLIENT_CACHE_MAX_ENTRIES, ttl=CLIENT_CACHE_TTL)
+def get_embeddings(openai_api_key):
+    """
+    Returns the embeddings client for an API key, created once per process
+    so its HTTP connection pool and tokenizer are reused across clicks.
+
+    Args:
+        openai_api_key (str): The user's OpenAI API key.
+
+    Returns:
+        OpenAIEmbeddings: The shared embeddings client.
+    """
+    # Chunks are packed into batched requests instead of one call per chunk.
+    # The client's own retries, with backoff, are the only retry layer for
+    # rate limits and transient errors.
+    return OpenAIEmbeddings(
+        model=EMBEDDING_MODEL,
+        openai_api_key=openai_api_key,
+        chunk_size=EMBEDDING_BATCH_SIZE,
+        max_retries=6
+    )
+
+@st.cache_resource(max_entries=CLIENT_CACHE_MAX_ENTRIES, ttl=CLIENT_CACHE_TTL)
+def get_chat_model(openai_api_key, streaming):
+    """
+    Returns the chat model client for an API key, created once per process.
+
+    Callbacks are passed per call rather than set here, so the cached
+    client is safe to share between sessions.
+
+    Args:
+        openai_api_key (str): The user's OpenAI API key.
+        streaming (bool): Whether the model streams tokens as it generates.
+
+    Returns:
+        ChatOpenAI: The shared chat model client.
+    """
+    return ChatOpenAI(
+        model_name="gpt-3.5-turbo",
+        openai_api_key=openai_api_key,
+        streaming=streaming
+    )
+
+def embed_chunks(embeddings, chunks):
+    """
+    Embeds the chunks in batches, sending the batch requests concurrently
+    from a thread pool.
+
+    The synchronous client is used because the cached embeddings client is
+    shared across clicks; its async HTTP pool would be bound to the event
+    loop of the first click. Each batch is converted to float32 and
+    normalized as soon as it arrives, while the remaining requests are
+    still in flight.
+
+    Args:
+        embeddings (OpenAIEmbeddings): The embeddings client.
+        chunks (list[str]): The text chunks to embed.
+
+    Returns:
+        np.ndarray: A float32 array with one unit-length embedding per
+        chunk, in the same order.
+    """
+    def embed_batch(start):
+        return start, embeddings.embed_documents(chunks[start:start + EMBEDDING_BATCH_SIZE])
+
+    vectors = None
+    executor = ThreadPoolExecutor(max_workers=EMBEDDING_CONCURRENCY)
+    try:
+        requests = [
+            executor.submit(embed_batch, start)
+            for start in range(0, len(chunks), EMBEDDING_BATCH_SIZE)
+        ]
+        for request in as_completed(requests):
+            start, batch_vectors = request.result()
+            batch = np.asarray(batch_vectors, dtype=np.float32)
+            # Unit-length vectors make the inner product equal cosine similarity.
+            # OpenAI embeddings are already normalized, so this is a safeguard.
+            faiss.normalize_L2(batch)
+            if vectors is None:
+                vectors = np.empty((len(chunks), batch.shape[1]), dtype=np.float32)
+            vectors[start:start + len(batch)] = batch
+    finally:
+        # If a batch failed, drop the queued ones instead of waiting for them
+        executor.shutdown(wait=False, cancel_futures=True)
+    return vectors
+
+def build_faiss_index(vectors):
+    """
+    Builds a FAISS index for the given embedding vectors.
+
+    Large documents get an IVF index with 8-bit scalar quantized lists;
+    smaller documents get a flat 8-bit scalar quantized index, which is
+    searched exhaustively.
+
+    Args:
+        vectors (np.ndarray): A float32 array of shape (num_chunks, dim).
+
+    Returns:
+        faiss.Index: A trained index containing all the vectors.
+    """
+    num_vectors, dim = vectors.shape
+    if num_vectors < IVF_MIN_VECTORS:
+        index = faiss.IndexScalarQuantizer(
+            dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(vectors)
+        index.add(vectors)
+        return index
+
+    nlist = min(
+        4 * int(math.sqrt(num_vectors)),
+        num_vectors // IVF_MIN_POINTS_PER_LIST,
+        IVF_MAX_NLIST
+    )
+    quantizer = faiss.IndexFlatIP(dim)
+    index = faiss.IndexIVFScalarQuantizer(
+        quantizer, dim, nlist, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT
+    )
+    if num_vectors > IVF_MAX_TRAINING_VECTORS:
+        sample = np.random.default_rng(0).choice(
+            num_vectors, IVF_MAX_TRAINING_VECTORS, replace=False
+        )
+        index.train(vectors[sample])
+    else:
+        index.train(vectors)
+    index.add(vectors)
+    prepare_ivf_index(index)
+    return index
+
+def prepare_ivf_index(index):
+    """
+    Applies the search-time settings of an IVF index, which are not saved
+    with it on disk.
+
+    Args:
+        index (faiss.IndexIVF): The index to configure in place.
+    """
+    # Number of inverted lists probed per query on the retriever path
+    index.nprobe = IVF_NPROBE
+    # MMR retrieval reconstructs candidate vectors by id
+    index.make_direct_map()
+
+def move_index_to_gpu(index):
+    """
+    Copies an IVF scalar quantized index to the first GPU when one is
+    available. Other index types are returned unchanged: the flat scalar
+    quantizer used for small documents has no GPU counterpart.
+
+    Args:
+        index (faiss.Index): The CPU index.
+
+    Returns:
+        faiss.Index: The GPU copy of the index, or the original index if
+        there is no usable GPU or the index type is not supported there.
+    """
+    if not isinstance(index, faiss.IndexIVFScalarQuantizer):
+        return index
+    try:
+        if faiss.get_num_gpus() == 0:
+            return index
+        resources = faiss.StandardGpuResources()
+        gpu_index = faiss.index_cpu_to_gpu(resources, 0, index)
+        gpu_index.nprobe = IVF_GPU_NPROBE
+        # MMR retrieval needs to reconstruct vectors, so make sure it works
+        gpu_index.reconstruct(0)
+        return gpu_index
+    except Exception:
+        # faiss-cpu builds have no GPU support; keep searching on the CPU
+        return index
+
+def get_cache_path(document_hash):
+    """
+    Returns the cache directory for a document under the current settings.
+
+    Args:
+        document_hash (str): The SHA-256 hex digest of the document text.
+
+    Returns:
+        str: The path of the document's cache entry.
+    """
+    settings_hash = hashlib.sha256(repr(CACHE_SETTINGS).encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, f"{document_hash}-{settings_hash[:16]}.faiss")
+
+def save_vectorstore(vectorstore, cache_path):
+    """
+    Saves a vector store's index and docstore into a cache directory.
+
+    The entry is written to a temporary directory under CACHE_DIR and then
+    renamed into place, so other sessions never see, or memory-map, a
+    partially written index. If another session saved the same entry
+    first, its entry is kept.
+
+    Args:
+        vectorstore (FAISS): The vector store to save. Its index must be on the CPU.
+        cache_path (str): The cache directory for the document.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    temp_path = tempfile.mkdtemp(prefix=".tmp-", dir=CACHE_DIR)
+    try:
+        index_path = os.path.join(temp_path, CACHE_INDEX_FILE)
+        faiss.write_index(vectorstore.index, index_path)
+
+        # Check that the saved index reads back and reconstructs the same
+        # vectors before the entry is published
+        saved_index = read_cached_index(index_path)
+        if isinstance(saved_index, faiss.IndexIVF):
+            saved_index.make_direct_map()
+        sample_ids = range(0, vectorstore.index.ntotal, max(1, vectorstore.index.ntotal // 8))
+        for i in sample_ids:
+            if not np.array_equal(saved_index.reconstruct(i), vectorstore.index.reconstruct(i)):
+                raise RuntimeError(f"Cached index at {index_path} does not match the built index.")
+        del saved_index
+
+        with open(os.path.join(temp_path, CACHE_DOCSTORE_FILE), "wb") as f:
+            pickle.dump((vectorstore.docstore, vectorstore.index_to_docstore_id), f)
+
+        try:
+            os.replace(temp_path, cache_path)
+        except OSError:
+            # The rename fails if the entry already exists
+            if not os.path.isdir(cache_path):
+                raise
+    finally:
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+def read_cached_index(index_path):
+    """
+    Reads an index written by save_vectorstore, memory-mapping IVF lists.
+
+    Args:
+        index_path (str): The path of the saved index file.
+
+    Returns:
+        faiss.Index: The read-only index.
+    """
+    return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+def load_vectorstore(cache_path, embeddings):
+    """
+    Loads a vector store saved by save_vectorstore.
+
+    IVF indexes are opened with their inverted lists memory-mapped
+    read-only, so loading does not copy the codes into process memory and
+    concurrent sessions share the same page cache. The flat scalar quantized
+    index used for small documents is read into memory as usual.
+
+    Args:
+        cache_path (str): The cache directory for the document.
+        embeddings (OpenAIEmbeddings): The embeddings client used for queries.
+
+    Returns:
+        FAISS: The cached vector store.
+    """
+    index = read_cached_index(os.path.join(cache_path, CACHE_INDEX_FILE))
+    with open(os.path.join(cache_path, CACHE_DOCSTORE_FILE), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    if isinstance(index, faiss.IndexIVF):
+        prepare_ivf_index(index)
+    return FAISS(
+        embedding_function=embeddings.embed_query,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+        distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+    )
+
+def iter_document_segments(uploaded_file):
+    """
+    Decodes an uploaded file incrementally, yielding segments of text.
+
+    Segments end on line breaks and hold about DOCUMENT_SEGMENT_SIZE
+    characters, so the whole document is never held as a single string.
+
+    Args:
+        uploaded_file (UploadedFile): The file from Streamlit's file uploader.
+
+    Yields:
+        str: Consecutive segments of the document text.
+    """
+    uploaded_file.seek(0)
+    text_stream = io.TextIOWrapper(uploaded_file, encoding="utf-8", errors="replace", newline="")
+    try:
+        lines = []
+        size = 0
+        for line in text_stream:
+            lines.append(line)
+            size += len(line)
+            if size >= DOCUMENT_SEGMENT_SIZE:
+                yield "".join(lines)
+                lines = []
+                size = 0
+        if lines:
+            yield "".join(lines)
+    finally:
+        # Detach so the wrapper doesn't close the uploaded file when collected
+        text_stream.detach()
+
+def process_document(document_segments, openai_api_key):
     """
     Processes the uploaded document text by splitting it into chunks,
     creating embeddings, and storing them in a vector store.
 
+    The vector store is cached on disk, so processing a document that was
+    already seen loads the saved index instead of calling OpenAI again.
+
     Args:
-        document_text (str): The text content of the uploaded document.
+        document_segments (Iterable[str]): The text content of the uploaded
+            document, in consecutive segments.
         openai_api_key (str): The user's OpenAI API key.
 
     Returns:
         FAISS: A vector store containing the document's text chunks.
     """
     try:
-        # 1. Split the document into smaller chunks
-        text_splitter = CharacterTextSplitter(
-            separator="\n",
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
-        )
-        chunks = text_splitter.split_text(document_text)
+        embeddings = get_embeddings(openai_api_key)
+        text_splitter = get_text_splitter()
+
+        # 1. Split the document into smaller chunks, one segment at a time,
+        # hashing the text along the way to look up the cache
+        document_hash = hashlib.sha256()
+        chunks = []
+        last_chunk = ""
+        for segment in document_segments:
+            document_hash.update(segment.encode("utf-8"))
+            # Hold back the last chunk and split it again with the next
+            # segment, so chunks keep their overlap across segment boundaries
+            text = f"{last_chunk}\n{segment}" if last_chunk else segment
+            segment_chunks = text_splitter.split_text(text)
+            if segment_chunks:
+                chunks.extend(segment_chunks[:-1])
+                last_chunk = segment_chunks[-1]
+        if last_chunk:
+            chunks.append(last_chunk)
 
         if not chunks:
             st.error("Could not split the document into chunks. Please check the document format.")
             return None
 
+        cache_path = get_cache_path(document_hash.hexdigest())
+        if os.path.exists(os.path.join(cache_path, CACHE_DOCSTORE_FILE)):
+            try:
+                vectorstore = load_vectorstore(cache_path, embeddings)
+                vectorstore.index = move_index_to_gpu(vectorstore.index)
+                return vectorstore
+            except Exception:
+                # A truncated index or a docstore pickle from an older
+                # library version; drop the entry and rebuild it below
+                shutil.rmtree(cache_path, ignore_errors=True)
+
         # 2. Create embeddings for the chunks using OpenAI
-        embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
+        vectors = embed_chunks(embeddings, chunks)
 
         # 3. Create a FAISS vector store from the embeddings
         # This allows for efficient similarity searches
-        vectorstore = FAISS.from_texts(texts=chunks, embedding=embeddings)
+        index = build_faiss_index(vectors)
+        vectorstore = FAISS(
+            embedding_function=embeddings.embed_query,
+            index=index,
+            docstore=InMemoryDocstore(
+                {str(i): Document(page_content=chunk) for i, chunk in enumerate(chunks)}
+            ),
+            index_to_docstore_id={i: str(i) for i in range(len(chunks))},
+            distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+        )
+        # GPU indexes cannot be serialized, so save before moving to the GPU.
+        # The embeddings are already paid for, so a cache failure only warns.
+        try:
+            save_vectorstore(vectorstore, cache_path)
+        except Exception as e:
+            st.warning(f"The document was processed but could not be cached: {e}")
+        vectorstore.index = move_index_to_gpu(index)
         return vectorstore
 
     except Exception as e:
         st.error(f"An error occurred during document processing: {e}")
         return None
 
+def get_retriever(vectorstore):
+    """
+    Returns the retriever for a vector store, building it on first use and
+    keeping it on the vector store so later chains reuse the same object.
+
+    Args:
+        vectorstore (FAISS): The vector store containing the document embeddings.
+
+    Returns:
+        VectorStoreRetriever: The vector store's retriever.
+    """
+    if getattr(vectorstore, "_retriever", None) is None:
+        # Use MMR so near-duplicate chunks don't crowd out the prompt
+        vectorstore._retriever = vectorstore.as_retriever(
+            search_type="mmr",
+            search_kwargs={
+                "k": RETRIEVER_K,
+                "fetch_k": RETRIEVER_FETCH_K,
+                "lambda_mult": RETRIEVER_LAMBDA_MULT
+            }
+        )
+    return vectorstore._retriever
+
 def get_conversation_chain(vectorstore, openai_api_key):
     """
     Creates a conversational retrieval chain.
@@ -93,23 +583,27 @@ def get_conversation_chain(vectorstore, openai_api_key):
     Returns:
         ConversationalRetrievalChain: The initialized conversation chain.
     """
-    # Initialize the language model
-    llm = ChatOpenAI(
-        model_name="gpt-3.5-turbo",
-        openai_api_key=openai_api_key,
-        streaming=True # Enable streaming for a more interactive experience
-    )
+    # Initialize the language models. Only the answer is streamed to the UI;
+    # rephrasing the question and summarizing history run without streaming
+    # so their tokens never reach the callback handler.
+    answer_llm = get_chat_model(openai_api_key, streaming=True) # Enable streaming for a more interactive experience
+    condense_llm = get_chat_model(openai_api_key, streaming=False)
 
-    # Set up memory to keep track of the conversation history
-    memory = ConversationBufferMemory(
+    # Set up memory to keep track of the conversation history.
+    # Older turns are condensed into a running summary, so the prompt
+    # stays bounded as the conversation grows.
+    memory = ConversationSummaryBufferMemory(
+        llm=condense_llm,
+        max_token_limit=MEMORY_MAX_TOKENS,
         memory_key='chat_history',
         return_messages=True
     )
 
     # Create the conversation chain
     conversation_chain = ConversationalRetrievalChain.from_llm(
-        llm=llm,
-        retriever=vectorstore.as_retriever(),
+        llm=answer_llm,
+        condense_question_llm=condense_llm,
+        retriever=get_retriever(vectorstore),
         memory=memory
     )
     return conversation_chain
@@ -155,10 +649,10 @@ def main():
             if uploaded_file is not None and openai_api_key:
                 with st.spinner("Processing document... This may take a moment."):
                     # Read the content of the uploaded file
-                    document_text = uploaded_file.getvalue().decode("utf-8")
+                    document_segments = iter_document_segments(uploaded_file)
 
                     # Process the document to create a vector store
-                    vectorstore = process_document(document_text, openai_api_key)
+                    vectorstore = process_document(document_segments, openai_api_key)
 
                     if vectorstore:
                         # Create the conversation chain
@@ -177,7 +671,14 @@ def main():
     st.markdown("Ask a question about the content of your uploaded document.")
 
     # Display chat history
-    for message in st.session_state.chat_history:
+    older_messages = st.session_state.chat_history[:-CHAT_HISTORY_VISIBLE_MESSAGES]
+    recent_messages = st.session_state.chat_history[-CHAT_HISTORY_VISIBLE_MESSAGES:]
+    if older_messages:
+        with st.expander(f"Earlier messages ({len(older_messages)})"):
+            for message in older_messages:
+                with st.chat_message(message["role"]):
+                    st.markdown(message["content"])
+    for message in recent_messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
@@ -199,8 +700,11 @@ def main():
                     'question': user_question
                 }, callbacks=[callback_handler])
                 
+                answer = response['answer']
+                message_placeholder.markdown(answer)
+
                 # Add AI response to chat history
-                st.session_state.chat_history.append({"role": "assistant", "content": response['chat_history'][-1].content})
+                st.session_state.chat_history.append({"role": "assistant", "content": answer})
 
             except Exception as e:
                 st.error(f"An error occurred while generating the response: {e}")